@@ -36,7 +36,7 @@ with open(path.join(cwd, 'README.md'), encoding='utf-8') as f:
 
 __version__ = '0.0.1dev11'
 REQUIRED_PACKAGES = [
-    'attrs >= 18.2.0', 'tensorflow-probability >= 0.8.0', 'numpy >= 1.16.0'
+    'attrs >= 18.2.0', 'tensorflow-probability >= 0.8.0', 'numpy >= 1.20.0'
 ]
 
 project_name = 'tf-quant-finance'
@@ -21,7 +21,6 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
-import numpy as np
 import tensorflow as tf
 
 SplineParameters = collections.namedtuple(
@@ -327,15 +326,16 @@ def _prepare_indices(indices):
   """Prepares `tf.searchsorted` output for index argument of `tf.gather_nd`."""
   batch_shape = indices.shape.as_list()[:-1]
   num_points = indices.shape.as_list()[-1]
-  batch_shape_reverse = indices.shape.as_list()[:-1]
-  batch_shape_reverse.reverse()
-  index_matrix = tf.constant(
-      np.flip(np.transpose(np.indices(batch_shape_reverse)), -1),
-      dtype=indices.dtype)
   batch_rank = len(batch_shape)
-  # Broadcast index matrix to the shape of
-  # `batch_shape + [num_points] + [batch_rank]`
-  broadcasted_shape = batch_shape + [num_points] + [batch_rank]
-  index_matrix = tf.expand_dims(index_matrix, -2) + tf.zeros(
-      broadcasted_shape, dtype=indices.dtype)
-  return index_matrix
+  if batch_rank == 0:
+    return tf.zeros([num_points, 0], dtype=indices.dtype)
+  # Build the index grid of shape `batch_shape + [num_points] + [batch_rank]`
+  # directly on the device. `tf.meshgrid` broadcasts the per-axis coordinates
+  # over `batch_shape + [num_points]`; stacking the batch-axis grids yields
+  # the same matrix as the NumPy indices/transpose/flip construction without
+  # the host-side computation and host-to-device transfer.
+  grids = tf.meshgrid(
+      *[tf.range(dim, dtype=indices.dtype)
+        for dim in batch_shape + [num_points]],
+      indexing="ij")
+  return tf.stack(grids[:-1], axis=-1)
@@ -15,7 +15,6 @@
 # Lint as: python2, python3
 """Linear interpolation method."""
 
-import numpy as np
 import tensorflow as tf
 
 
@@ -108,7 +107,6 @@ def interpolate(x,
     with tf.control_dependencies(control_deps):
       # Get upper bound indices for `x`.
       upper_indices = tf.searchsorted(x_data, x, side='left', out_type=tf.int32)
-      index_matrix = _prepare_indices(upper_indices)
       x_data_size = x_data.shape.as_list()[-1]
       at_min = tf.equal(upper_indices, 0)
       at_max = tf.equal(upper_indices, x_data_size)
@@ -128,15 +126,19 @@ def interpolate(x,
       # `tf.where` evaluates all branches, need to cap indices to ensure it
       # won't go out of bounds.
       capped_lower_indices = tf.math.maximum(upper_indices - 1, 0)
-      selection_matrix_lower = tf.concat(
-          [index_matrix, tf.expand_dims(capped_lower_indices, -1)], -1)
       capped_upper_indices = tf.math.minimum(upper_indices, x_data_size - 1)
-      selection_matrix_upper = tf.concat(
-          [index_matrix, tf.expand_dims(capped_upper_indices, -1)], -1)
-      x_data_lower = tf.gather_nd(x_data, selection_matrix_lower)
-      x_data_upper = tf.gather_nd(x_data, selection_matrix_upper)
-      y_data_lower = tf.gather_nd(y_data, selection_matrix_lower)
-      y_data_upper = tf.gather_nd(y_data, selection_matrix_upper)
+      # `tf.gather` with `batch_dims` performs the per-batch lookups directly
+      # from the capped indices, without materializing an index grid for
+      # `tf.gather_nd`.
+      batch_rank = x.shape.rank - 1
+      x_data_lower = tf.gather(x_data, capped_lower_indices,
+                               batch_dims=batch_rank)
+      x_data_upper = tf.gather(x_data, capped_upper_indices,
+                               batch_dims=batch_rank)
+      y_data_lower = tf.gather(y_data, capped_lower_indices,
+                               batch_dims=batch_rank)
+      y_data_upper = tf.gather(y_data, capped_upper_indices,
+                               batch_dims=batch_rank)
 
       # Nan in unselected branches could propagate through gradient calculation,
       # hence we need to clip the values to ensure no nan would occur. In this
@@ -152,21 +154,3 @@ def interpolate(x,
         return interpolated
       else:
         return tf.squeeze(interpolated, 0)
-
-
-def _prepare_indices(indices):
-  """Prepares `tf.searchsorted` output for index argument of `tf.gather_nd`."""
-  batch_shape = indices.shape.as_list()[:-1]
-  num_points = indices.shape.as_list()[-1]
-  batch_shape_reverse = indices.shape.as_list()[:-1]
-  batch_shape_reverse.reverse()
-  index_matrix = tf.constant(
-      np.flip(np.transpose(np.indices(batch_shape_reverse)), -1),
-      dtype=indices.dtype)
-  batch_rank = len(batch_shape)
-  # Broadcast index matrix to the shape of
-  # `batch_shape + [num_points] + [batch_rank]`
-  broadcasted_shape = batch_shape + [num_points] + [batch_rank]
-  index_matrix = tf.expand_dims(index_matrix, -2) + tf.zeros(
-      broadcasted_shape, dtype=indices.dtype)
-  return index_matrix
@@ -21,11 +21,23 @@ from __future__ import print_function
 import numpy as np
 import tensorflow as tf
 
+try:
+  # Optional dependency used to accelerate small CPU-bound searches.
+  import numba
+except ImportError:
+  numba = None
 
-class PiecewiseConstantFunc(object):
+# Maximum number of elements for which the Numba binary search is preferred
+# over `tf.searchsorted`. Below this size the op dispatch overhead dominates
+# the O(log n) search work.
+_NUMBA_SEARCHSORTED_SIZE_THRESHOLD = 10000
+
+
+class PiecewiseConstantFunc(tf.Module):
   """Creates a piecewise constant function."""
 
-  def __init__(self, jump_locations, values, dtype=None, name=None):
+  def __init__(self, jump_locations, values, dtype=None, compute_dtype=None,
+               use_xla=False, name=None):
     r"""Initializes jumps of the piecewise constant function.
 
     Sets jump locations and values for a piecewise constant function.
@@ -79,21 +91,41 @@ class PiecewiseConstantFunc(object):
     ```
 
     Args:
-      jump_locations: A real `Tensor` of shape
+      jump_locations: A real `Tensor` or `tf.Variable` of shape
         `batch_shape + [num_jump_points]`. The locations where the function
         changes its values. Note that the values are expected to be ordered
         along the last dimension. Repeated values are allowed but it is
         up to the user to ensure that the corresponding `values` are also
-        repeated.
-      values: A `Tensor` of the same `dtype` as `jump_locations` and shape
+        repeated. A `tf.Variable` is captured by reference by the traced
+        graphs, so in-place assignments to it are picked up without
+        retracing.
+      values: A `Tensor` or `tf.Variable` of the same `dtype` as
+        `jump_locations` and shape
         `batch_shape + [num_jump_points + 1] + event_shape`. Defines
         `values[batch_rank * slice(None), i]` on intervals
         `(jump_locations[..., i - 1], jump_locations[..., i])`. Here
         `event_shape` allows for array-valued piecewise constant functions
-        and `batch_rank = len(batch_shape)`.
+        and `batch_rank = len(batch_shape)`. A `tf.Variable` is captured by
+        reference, as for `jump_locations`.
       dtype:  Optional dtype for `jump_locations` and `values`.
         Default value: `None` which maps to the default dtype inferred by
         TensorFlow.
+      compute_dtype: Optional dtype in which `jump_locations` and `values`
+        are stored and in which the search, gather, and integration ops run.
+        The evaluation and integration are memory bound, so a narrower type
+        (e.g., `tf.float32` for `np.float64` inputs) halves the bandwidth
+        they consume at the cost of precision. Outputs of `__call__` and
+        `integrate` are cast back to `dtype`. Ignored when `jump_locations`
+        or `values` is a `tf.Variable`, since casting would capture the data
+        by value.
+        Default value: `None` which means that the computations are performed
+        in `dtype`.
+      use_xla: Optional Python `bool`. Whether to compile function evaluation
+        and integration with XLA (i.e., `jit_compile=True`). XLA fuses the
+        elementwise tail of the computation into a single kernel, which
+        reduces memory traffic on accelerators. Requires the input shapes to
+        be static.
+        Default value: `False`.
       name: Python `str` name prefixed to ops created by this class.
         Default value: `None` which is mapped to the default name
         `PiecewiseConstantFunc`.
@@ -104,19 +136,46 @@ class PiecewiseConstantFunc(object):
         in case of static shapes, if the event shape of `values` is different
         from `num_jump_points + 1`.
     """
+    super().__init__(name=None)
     self._name = name or 'PiecewiseConstantFunc'
     # Add a property that indicates that the class instance is a
     # piecewise constant function
     self.is_piecewise_constant = True
-    with tf.compat.v1.name_scope(self._name, values=[jump_locations, values]):
-      self._jump_locations = tf.convert_to_tensor(jump_locations, dtype=dtype,
-                                                  name='jump_locations')
-      self._values = tf.convert_to_tensor(values, dtype=dtype,
-                                          name='values')
+    self._use_xla = use_xla
+    with tf.name_scope(self._name):
+      # `tf.Variable` inputs are kept as-is so that the traced graphs capture
+      # them by reference: reassigning a variable updates the function
+      # without retracing, e.g., inside a calibration loop.
+      self._has_variables = (isinstance(jump_locations, tf.Variable)
+                             or isinstance(values, tf.Variable))
+      if isinstance(jump_locations, tf.Variable):
+        self._jump_locations = jump_locations
+      else:
+        self._jump_locations = tf.convert_to_tensor(
+            jump_locations, dtype=dtype, name='jump_locations')
+      if isinstance(values, tf.Variable):
+        self._values = values
+      else:
+        self._values = tf.convert_to_tensor(values, dtype=dtype,
+                                            name='values')
+      self._dtype = self._values.dtype
+      if compute_dtype is not None and not self._has_variables:
+        compute_dtype = tf.as_dtype(compute_dtype)
+        if compute_dtype != self._dtype:
+          self._jump_locations = tf.cast(self._jump_locations, compute_dtype,
+                                         name='jump_locations_compute')
+          self._values = tf.cast(self._values, compute_dtype,
+                                 name='values_compute')
       shape_values = self._values.shape.as_list()
       shape_jump_locations = self._jump_locations.shape.as_list()
       batch_rank = len(shape_jump_locations[:-1])
       self._batch_rank = batch_rank
+      # Scalar-valued functions (empty event shape) are the dominant case,
+      # e.g., for yield curves and hazard rates.
+      self._event_rank = len(shape_values) - batch_rank - 1
+      # The batch shape is static after construction, so capture it once
+      # instead of recovering it from the tensor shapes on every call.
+      self._batch_shape = shape_jump_locations[:-1]
       if shape_values[:batch_rank] != shape_jump_locations[:-1]:
         raise ValueError('Batch shapes of `values` and `jump_locations` should '
                          'be the same but are {0} and {1}'.format(
@@ -126,6 +185,22 @@ class PiecewiseConstantFunc(object):
                          'element than the event shape of `jump_locations` '
                          'but are {0} and {1}'.format(
                              shape_values[-1], shape_jump_locations[-1]))
+      # When the jump locations are an unbatched float32 constant, stash them
+      # as Python floats so that evaluation can use `tf.raw_ops.Bucketize`,
+      # which bakes the boundaries into the op attributes and needs no tensor
+      # input for the jump locations. The op stores the boundaries in single
+      # precision, so it only faithfully replaces `tf.searchsorted` for
+      # float32 data.
+      self._boundaries = None
+      if batch_rank == 0 and self._jump_locations.dtype == tf.float32:
+        jump_locations_np = tf.get_static_value(self._jump_locations)
+        if jump_locations_np is not None:
+          self._boundaries = tuple(float(b) for b in jump_locations_np)
+      # Lazily built `tf.function` specializations. The input signatures leave
+      # the number of points dynamic, so evaluations with different
+      # `num_points` share a single trace instead of retracing per shape.
+      self._call_graphs = {}
+      self._integrate_graph = None
 
   def values(self):
     """The value of the piecewise constant function between jump locations."""
@@ -169,13 +244,26 @@ class PiecewiseConstantFunc(object):
         If `batch_shape` of `x` is incompatible with the batch shape of
         `self.jump_locations()`.
     """
-    with tf.compat.v1.name_scope(name, self._name + '_call', [x]):
-      x = tf.convert_to_tensor(x, dtype=self._jump_locations.dtype, name='x')
-      batch_shape = self._jump_locations.shape.as_list()[:-1]
-      x = _try_broadcast_to(x, batch_shape, name='x')
+    with tf.name_scope(name or self._name + '_call'):
+      # Convert with a hint rather than an explicit dtype: with
+      # `compute_dtype` set, an explicit dtype would refuse to cast a `Tensor`
+      # argument supplied in the instance's own `dtype`.
+      x = tf.convert_to_tensor(x, dtype_hint=self._dtype, name='x')
+      if x.dtype != self._jump_locations.dtype:
+        x = tf.cast(x, self._jump_locations.dtype)
+      x = _try_broadcast_to(x, self._batch_shape, name='x')
       side = 'left' if left_continuous else 'right'
-      return _piecewise_constant_function(
-          x, self._jump_locations, self._values, self._batch_rank, side=side)
+      if not self._use_xla and _use_eager_fast_path(x, self._jump_locations):
+        # For small eager CPU inputs, skip the traced graph so that the Numba
+        # binary search can be used in place of `tf.searchsorted`.
+        res = _piecewise_constant_function(
+            x, self._jump_locations, self._values, self._batch_rank,
+            side=side, boundaries=self._boundaries)
+      else:
+        res = self._function_graph(side)(x)
+      if res.dtype != self._dtype:
+        res = tf.cast(res, self._dtype)
+      return res
 
   def integrate(self, x1, x2, name=None):
     """Integrates the piecewise constant function between end points.
@@ -202,16 +290,76 @@ class PiecewiseConstantFunc(object):
         If `batch_shape` of `x1` and `x2` are incompatible with the batch shape
         of `self.jump_locations()`.
     """
-    with tf.compat.v1.name_scope(name, self._name + '_integrate', [x1, x2]):
-      x1 = tf.convert_to_tensor(x1, dtype=self._jump_locations.dtype,
-                                name='x1')
-      x2 = tf.convert_to_tensor(x2, dtype=self._jump_locations.dtype,
-                                name='x2')
-      batch_shape = self._jump_locations.shape.as_list()[:-1]
-      x1 = _try_broadcast_to(x1, batch_shape, name='x1')
-      x2 = _try_broadcast_to(x2, batch_shape, name='x1')
-      return _piecewise_constant_integrate(
-          x1, x2, self._jump_locations, self._values, self._batch_rank)
+    with tf.name_scope(name or self._name + '_integrate'):
+      # See the comment in `__call__` on why the dtype is a hint followed by
+      # a cast.
+      x1 = tf.convert_to_tensor(x1, dtype_hint=self._dtype, name='x1')
+      x2 = tf.convert_to_tensor(x2, dtype_hint=self._dtype, name='x2')
+      if x1.dtype != self._jump_locations.dtype:
+        x1 = tf.cast(x1, self._jump_locations.dtype)
+      if x2.dtype != self._jump_locations.dtype:
+        x2 = tf.cast(x2, self._jump_locations.dtype)
+      x1 = _try_broadcast_to(x1, self._batch_shape, name='x1')
+      x2 = _try_broadcast_to(x2, self._batch_shape, name='x1')
+      if not self._use_xla and _use_eager_fast_path(
+          x1, x2, self._jump_locations):
+        integrals = _cumulative_integrals(
+            self._jump_locations, self._values, self._batch_rank)
+        res = _piecewise_constant_integrate(
+            x1, x2, self._jump_locations, self._values, integrals,
+            self._batch_rank)
+      else:
+        res = self._integrate_graph_fn()(x1, x2)
+      if res.dtype != self._dtype:
+        res = tf.cast(res, self._dtype)
+      return res
+
+  def _input_spec(self):
+    """Returns a `TensorSpec` for points with a dynamic `num_points` axis."""
+    return tf.TensorSpec(shape=self._batch_shape + [None],
+                         dtype=self._jump_locations.dtype)
+
+  def _function_graph(self, side):
+    """Returns a cached trace of the function evaluation for `side`."""
+    fn = self._call_graphs.get(side)
+    if fn is None:
+      # `Bucketize` has no XLA lowering, so keep `searchsorted` when
+      # compiling.
+      boundaries = None if self._use_xla else self._boundaries
+
+      def evaluate(x):
+        return _piecewise_constant_function(
+            x, self._jump_locations, self._values, self._batch_rank,
+            side=side, boundaries=boundaries)
+
+      fn = tf.function(evaluate, input_signature=[self._input_spec()],
+                       jit_compile=self._use_xla or None,
+                       reduce_retracing=True)
+      self._call_graphs[side] = fn
+    return fn
+
+  def _integrate_graph_fn(self):
+    """Returns a cached trace of the integration."""
+    if self._integrate_graph is None:
+
+      def integrate(x1, x2):
+        # The cumulative integrals are computed inside the trace so that
+        # gradients with respect to tensor-backed `jump_locations` and
+        # `values` flow through `integrate`. For constant data the cumulative
+        # sum over the captured constants is folded when the cached trace is
+        # optimized; for `tf.Variable` data it reads the variables by
+        # reference on each call.
+        integrals = _cumulative_integrals(
+            self._jump_locations, self._values, self._batch_rank)
+        return _piecewise_constant_integrate(
+            x1, x2, self._jump_locations, self._values, integrals,
+            self._batch_rank)
+
+      spec = self._input_spec()
+      self._integrate_graph = tf.function(
+          integrate, input_signature=[spec, spec],
+          jit_compile=self._use_xla or None, reduce_retracing=True)
+    return self._integrate_graph
 
 
 def find_interval_index(query_xs,
@@ -258,10 +406,7 @@ def find_interval_index(query_xs,
     the point lies to the right of all intervals (if `last_interval_is_closed`
     is `True`).
   """
-  with tf.compat.v1.name_scope(
-      name,
-      default_name='find_interval_index',
-      values=[query_xs, interval_lower_xs, last_interval_is_closed]):
+  with tf.name_scope(name or 'find_interval_index'):
     # TODO(b/138988951): add ability to validate that intervals are increasing.
     # TODO(b/138988951): validate that if last_interval_is_closed, input size
     # must be > 1.
@@ -271,25 +416,32 @@ def find_interval_index(query_xs,
     # Result assuming that last interval is half-open.
     indices = tf.searchsorted(interval_lower_xs, query_xs, side='right') - 1
 
-    # Handling the branch if the last interval is closed.
-    last_index = tf.shape(interval_lower_xs)[-1] - 1
-    last_x = tf.gather(interval_lower_xs, [last_index], axis=-1)
-    # should_cap is a tensor true where a cell is true iff indices is the last
-    # index at that cell and the query x <= the right boundary of the last
-    # interval.
-    should_cap = tf.logical_and(
-        tf.equal(indices, last_index), tf.less_equal(query_xs, last_x))
-
-    # cap to last_index if the query x is not in the last interval, otherwise,
-    # cap to last_index - 1.
-    caps = last_index - tf.cast(should_cap, dtype=tf.dtypes.int32)
-
-    return tf.compat.v1.where(last_interval_is_closed,
-                              tf.minimum(indices, caps), indices)
+    def _cap_closed_interval():
+      """Caps `indices` assuming that the last interval is closed."""
+      last_index = tf.shape(interval_lower_xs)[-1] - 1
+      last_x = interval_lower_xs[..., -1:]
+      # should_cap is a tensor true where a cell is true iff indices is the
+      # last index at that cell and the query x <= the right boundary of the
+      # last interval.
+      should_cap = tf.logical_and(
+          tf.equal(indices, last_index), tf.less_equal(query_xs, last_x))
+      # `indices <= last_index` always holds, so capping is equivalent to
+      # subtracting one where the query lies in the closed last interval.
+      return indices - tf.cast(should_cap, dtype=tf.dtypes.int32)
+
+    if isinstance(last_interval_is_closed, bool):
+      # The branch is resolved at graph construction time, so only the ops of
+      # the selected branch are emitted.
+      return _cap_closed_interval() if last_interval_is_closed else indices
+
+    # With a `Tensor`-valued flag, `tf.cond` defers the branch selection to
+    # run time and skips the capping ops when the flag is false.
+    return tf.cond(last_interval_is_closed, _cap_closed_interval,
+                   lambda: indices)
 
 
 def _piecewise_constant_function(x, jump_locations, values,
-                                 batch_rank, side='left'):
+                                 batch_rank, side='left', boundaries=None):
   """Computes value of the piecewise constant function."""
   # Initializer already verified that `jump_locations` and `values` have the
   # same shape
@@ -300,102 +452,79 @@ def _piecewise_constant_function(x, jump_locations, values,
   if batch_shape_x != batch_shape:
     raise ValueError('Batch shape of `x` is {1} but should be {0}'.format(
         batch_shape, batch_shape_x))
-  if x.shape.as_list()[:batch_rank]:
-    no_batch_shape = False
-  else:
-    no_batch_shape = True
-    x = tf.expand_dims(x, 0)
-  # Expand batch size to one if there is no batch shape
-  if not batch_shape:
-    jump_locations = tf.expand_dims(jump_locations, 0)
-    values = tf.expand_dims(values, 0)
-  indices = tf.searchsorted(jump_locations, x, side=side)
-  index_matrix = _prepare_index_matrix(
-      indices.shape.as_list()[:-1], indices.shape.as_list()[-1], indices.dtype)
-  indices_nd = tf.concat(
-      [index_matrix, tf.expand_dims(indices, -1)], -1)
-  res = tf.gather_nd(values, indices_nd)
-  if no_batch_shape:
-    return tf.squeeze(res, 0)
+  # With `batch_dims` the lookup applies to the unbatched tensors directly,
+  # so no expand/squeeze pair is needed when there is no batch shape.
+  if boundaries is not None and side == 'right' and batch_rank == 0:
+    # `Bucketize` computes the same insertion index as a right-side
+    # `searchsorted`, with the boundaries encoded as op attributes, so the
+    # lookup needs no tensor input for the jump locations. The left-side
+    # tie-breaking cannot be expressed with `Bucketize`, hence the guard on
+    # `side`.
+    indices = tf.raw_ops.Bucketize(input=x, boundaries=list(boundaries))
   else:
-    return res
+    indices = _searchsorted(jump_locations, x, side)
+  res = tf.gather(values, indices, batch_dims=batch_rank)
+  res.set_shape(x.shape.concatenate(values.shape[batch_rank + 1:]))
+  return res
 
 
-def _piecewise_constant_integrate(x1, x2, jump_locations, values, batch_rank):
+def _piecewise_constant_integrate(x1, x2, jump_locations, values, integrals,
+                                  batch_rank):
   """Integrates piecewise constant function between `x1` and `x2`."""
   # Initializer already verified that `jump_locations` and `values` have the
-  # same shape.
-  # Expand batch size to one if there is no batch shape.
-  if x1.shape.as_list()[:batch_rank]:
-    no_batch_shape = False
-  else:
-    no_batch_shape = True
-    x1 = tf.expand_dims(x1, 0)
-    x2 = tf.expand_dims(x2, 0)
-  if not jump_locations.shape.as_list()[:-1]:
-    jump_locations = tf.expand_dims(jump_locations, 0)
-    values = tf.expand_dims(values, 0)
-    batch_rank += 1
-
-  # Compute the index matrix that is later used for `tf.gather_nd`.
-  index_matrix = _prepare_index_matrix(
-      x1.shape.as_list()[:-1], x1.shape.as_list()[-1], tf.int32)
-  # Compute integral values at the jump locations starting from the first jump
-  # location.
+  # same shape; the cumulative `integrals` at the jump locations come from
+  # `_cumulative_integrals`. The gathers below use `batch_dims`, so the
+  # no-batch case operates on the unbatched tensors directly without an
+  # expand/squeeze pair.
   event_shape = values.shape[(batch_rank+1):]
-  num_data_points = values.shape.as_list()[batch_rank]
-  diff = jump_locations[..., 1:] - jump_locations[..., :-1]
-  # Broadcast `diff` to the shape of
-  # `batch_shape + [num_data_points - 2] + [1] * sample_rank`.
-  for _ in event_shape:
-    diff = tf.expand_dims(diff, -1)
-  slice_indices = batch_rank * [slice(None)]
-  slice_indices += [slice(1, num_data_points - 1)]
-  integrals = tf.cumsum(values[slice_indices] * diff, batch_rank)
-  # Pad integrals with zero values on left and right.
-  batch_shape = integrals.shape.as_list()[:batch_rank]
-  zeros = tf.zeros(batch_shape + [1] + event_shape, dtype=integrals.dtype)
-  integrals = tf.concat([zeros, integrals, zeros], axis=batch_rank)
-  # Get jump locations and values and the integration end points
-  value1, jump_location1, indices_nd1 = _get_indices_and_values(
-      x1, index_matrix, jump_locations, values, 'left', batch_rank)
-  value2, jump_location2, indices_nd2 = _get_indices_and_values(
-      x2, index_matrix, jump_locations, values, 'right', batch_rank)
-  integrals1 = tf.gather_nd(integrals, indices_nd1)
-  integrals2 = tf.gather_nd(integrals, indices_nd2)
+  event_rank = event_shape.rank
+  # Get the indices of the values and of the adjacent jump locations at the
+  # integration end points.
+  indices1, indices_jump1 = _get_indices(
+      x1, jump_locations, values, 'left', batch_rank)
+  indices2, indices_jump2 = _get_indices(
+      x2, jump_locations, values, 'right', batch_rank)
+  # Fuse the lookups for the two end points horizontally, so that each of
+  # `values`, `jump_locations` and `integrals` is gathered with one kernel
+  # instead of two.
+  indices_values = tf.concat([indices1, indices2], axis=-1)
+  indices_jumps = tf.concat([indices_jump1, indices_jump2], axis=-1)
+  value1, value2 = tf.split(
+      tf.gather(values, indices_values, batch_dims=batch_rank),
+      2, axis=batch_rank)
+  jump_location1, jump_location2 = tf.split(
+      tf.gather(jump_locations, indices_jumps, batch_dims=batch_rank),
+      2, axis=batch_rank)
+  integrals1, integrals2 = tf.split(
+      tf.gather(integrals, indices_jumps, batch_dims=batch_rank),
+      2, axis=batch_rank)
   # Broadcast `x1`, `x2`, `jump_location1`, `jump_location2` to the shape
   # `batch_shape + [num_points] + [1] * sample_rank`.
-  for _ in event_shape:
-    x1 = tf.expand_dims(x1, -1)
-    x2 = tf.expand_dims(x2, -1)
-    jump_location1 = tf.expand_dims(jump_location1, -1)
-    jump_location2 = tf.expand_dims(jump_location2, -1)
-  # Compute the value of the integral.
-  res = ((jump_location1 - x1) * value1
-         + (x2 - jump_location2) * value2
-         + integrals2 - integrals1)
-  if no_batch_shape:
-    return tf.squeeze(res, 0)
-  else:
-    return res
+  x1 = _expand_event_dims(x1, event_rank)
+  x2 = _expand_event_dims(x2, event_rank)
+  jump_location1 = _expand_event_dims(jump_location1, event_rank)
+  jump_location2 = _expand_event_dims(jump_location2, event_rank)
+  # Compute the value of the integral. `add_n` accumulates the three terms in
+  # a single kernel instead of pairwise adds, each of which would materialize
+  # a full-size intermediate tensor.
+  return tf.math.add_n([(jump_location1 - x1) * value1,
+                        (x2 - jump_location2) * value2,
+                        integrals2 - integrals1])
 
 
-def _get_indices_and_values(x, index_matrix, jump_locations, values, side,
-                            batch_rank):
-  """Computes values and jump locations of the piecewise constant function.
+def _get_indices(x, jump_locations, values, side, batch_rank):
+  """Computes indices of the values and jump locations nearest to `x`.
 
   Given `jump_locations` and the `values` on the corresponding segments of the
   piecewise constant function, the function identifies the nearest jump to `x`
-  from the right or left (which is determined by the `side` argument) and the
-  corresponding value of the piecewise constant function at `x`
+  from the right or left (which is determined by the `side` argument) and
+  returns the indices of the corresponding value of the piecewise constant
+  function and of the jump location. The gathers themselves are left to the
+  caller so that lookups for several sets of points can be batched.
 
   Args:
     x: A real `Tensor` of shape `batch_shape + [num_points]`. Points at which
       the function has to be evaluated.
-    index_matrix: An `int32` `Tensor` of shape
-      `batch_shape + [num_points] + [len(batch_shape)]` such that if
-      `batch_shape = [i1, .., in]`, then for all `j1, ..., jn, l`,
-      `index_matrix[j1,..,jn, l] = [j1, ..., jn]`.
     jump_locations: A `Tensor` of the same `dtype` as `x` and shape
       `batch_shape + [num_jump_points]`. The locations where the function
       changes its values. Note that the values are expected to be ordered
@@ -408,42 +537,139 @@ def _get_indices_and_values(x, index_matrix, jump_locations, values, side,
     batch_rank: A Python scalar stating the batch rank of `x`.
 
   Returns:
-    A tuple of three `Tensor` of the same `dtype` as `x` and shapes
-    `batch_shape + [num_points] + event_shape`, `batch_shape + [num_points]`,
-    and `batch_shape + [num_points] + [2 * len(batch_shape)]`. The `Tensor`s
-    correspond to the values, jump locations at `x`, and the corresponding
-    indices used to obtain jump locations via `tf.gather_nd`.
+    A tuple of two `int32` `Tensor`s of shape `batch_shape + [num_points]`.
+    The first contains the indices of the function values at `x` and the
+    second the indices of the nearest jump locations. Both are suitable for
+    `tf.gather` with `batch_dims=batch_rank`.
   """
-  indices = tf.searchsorted(jump_locations, x, side=side)
+  indices = _searchsorted(jump_locations, x, side)
   num_data_points = tf.shape(values)[batch_rank] - 2
   if side == 'right':
-    indices_jump = indices - 1
-    indices_jump = tf.maximum(indices_jump, 0)
+    indices_jump = tf.maximum(indices - 1, 0)
   else:
     indices_jump = tf.minimum(indices, num_data_points)
-  indices_nd = tf.concat(
-      [index_matrix, tf.expand_dims(indices, -1)], -1)
-  indices_jump_nd = tf.concat(
-      [index_matrix, tf.expand_dims(indices_jump, -1)], -1)
-  value = tf.gather_nd(values, indices_nd)
-  jump_location = tf.gather_nd(jump_locations, indices_jump_nd)
-  return value, jump_location, indices_jump_nd
-
-
-def _prepare_index_matrix(batch_shape, num_points, dtype):
-  """Prepares index matrix for index argument of `tf.gather_nd`."""
-  batch_shape_reverse = batch_shape.copy()
-  batch_shape_reverse.reverse()
-  index_matrix = tf.constant(
-      np.flip(np.transpose(np.indices(batch_shape_reverse)), -1),
-      dtype=dtype)
-  batch_rank = len(batch_shape)
-  # Broadcast index matrix to the shape of
-  # `batch_shape + [num_points] + [batch_rank]`.
-  broadcasted_shape = batch_shape + [num_points] + [batch_rank]
-  index_matrix = tf.expand_dims(index_matrix, -2) + tf.zeros(
-      tf.TensorShape(broadcasted_shape), dtype=dtype)
-  return index_matrix
+  return indices, indices_jump
+
+
+if numba is not None:
+  @numba.njit(parallel=True, cache=True)
+  def _numba_searchsorted(sorted_inputs, values, side_left):
+    """Binary-searches rows of `values` in rows of `sorted_inputs`."""
+    num_rows, num_queries = values.shape
+    num_inputs = sorted_inputs.shape[-1]
+    out = np.empty((num_rows, num_queries), dtype=np.int32)
+    for i in numba.prange(num_rows):  # pylint: disable=not-an-iterable
+      row = sorted_inputs[i]
+      for j in range(num_queries):
+        query = values[i, j]
+        low = 0
+        high = num_inputs
+        while low < high:
+          mid = (low + high) // 2
+          if row[mid] < query or (not side_left and row[mid] == query):
+            low = mid + 1
+          else:
+            high = mid
+        out[i, j] = low
+    return out
+else:
+  _numba_searchsorted = None
+
+
+def _use_eager_fast_path(*tensors):
+  """Whether to evaluate eagerly using the Numba searchsorted fast path."""
+  if _numba_searchsorted is None or not tf.executing_eagerly():
+    return False
+  for tensor in tensors:
+    num_elements = tensor.shape.num_elements()
+    if (num_elements is None
+        or num_elements >= _NUMBA_SEARCHSORTED_SIZE_THRESHOLD):
+      return False
+    if 'GPU' in tensor.device:
+      return False
+  return True
+
+
+def _searchsorted(sorted_inputs, values, side):
+  """Computes `tf.searchsorted` with a Numba fast path for small inputs.
+
+  For small eager CPU tensors the `tf.searchsorted` kernel dispatch costs more
+  than the O(log n) search itself. When Numba is available and the inputs are
+  small, run a parallel binary search compiled with `numba.njit` instead.
+  Inside a `tf.function` trace the fast path is skipped and the regular op is
+  emitted.
+
+  Args:
+    sorted_inputs: A real `Tensor` of shape `batch_shape + [num_inputs]` with
+      values sorted along the last dimension.
+    values: A `Tensor` of the same `dtype` as `sorted_inputs` and shape
+      `batch_shape + [num_queries]`. The values to search for.
+    side: A Python string, either `'left'` or `'right'`, with the same meaning
+      as in `tf.searchsorted`.
+
+  Returns:
+    An `int32` `Tensor` of the same shape as `values` containing the insertion
+    indices.
+  """
+  if _use_eager_fast_path(sorted_inputs, values):
+    sorted_np = sorted_inputs.numpy()
+    values_np = values.numpy()
+    indices = _numba_searchsorted(
+        sorted_np.reshape(-1, sorted_np.shape[-1]),
+        values_np.reshape(-1, values_np.shape[-1]),
+        side == 'left')
+    return tf.constant(indices.reshape(values_np.shape))
+  indices = tf.searchsorted(sorted_inputs, values, side=side)
+  # Pin the statically known query shape on the result. XLA requires static
+  # shapes to fuse the downstream gathers and arithmetic into one kernel.
+  indices.set_shape(values.shape)
+  return indices
+
+
+def _cumulative_integrals(jump_locations, values, batch_rank):
+  """Computes integrals of the function between the jump locations.
+
+  Args:
+    jump_locations: A real `Tensor` of shape `batch_shape + [num_jump_points]`
+      with the jump locations ordered along the last dimension.
+    values: A `Tensor` of the same `dtype` as `jump_locations` and shape
+      `batch_shape + [num_jump_points + 1] + event_shape` with the values of
+      the function between the jump locations.
+    batch_rank: A Python scalar stating the batch rank of `jump_locations`.
+
+  Returns:
+    A `Tensor` of shape `batch_shape + [num_jump_points + 1] + event_shape`
+    whose entry `i + 1` is the integral of the function between the first and
+    the `i`-th jump location, padded with zeros on the left and right.
+  """
+  event_shape = values.shape[(batch_rank+1):]
+  event_rank = event_shape.rank
+  num_data_points = values.shape.as_list()[batch_rank]
+  diff = jump_locations[..., 1:] - jump_locations[..., :-1]
+  # Broadcast `diff` to the shape of
+  # `batch_shape + [num_data_points - 2] + [1] * sample_rank`.
+  diff = _expand_event_dims(diff, event_rank)
+  slice_indices = batch_rank * [slice(None)]
+  slice_indices += [slice(1, num_data_points - 1)]
+  integrals = tf.cumsum(values[slice_indices] * diff, batch_rank)
+  # Pad integrals with zero values on left and right.
+  batch_shape = integrals.shape.as_list()[:batch_rank]
+  zeros = tf.zeros(batch_shape + [1] + event_shape, dtype=integrals.dtype)
+  return tf.concat([zeros, integrals, zeros], axis=batch_rank)
+
+
+def _expand_event_dims(x, event_rank):
+  """Appends `event_rank` unit dimensions to `x` with a single reshape."""
+  if event_rank == 0:
+    # Scalar-valued functions broadcast directly against the gathered values,
+    # so the common case emits no reshape at all.
+    return x
+  target_shape = x.shape.as_list()
+  # The size of the points axis may be dynamic (e.g., under an input
+  # signature with a flexible number of points); at most one dimension can be
+  # unknown here since the batch shape is static.
+  target_shape = [-1 if dim is None else dim for dim in target_shape]
+  return tf.reshape(x, target_shape + [1] * event_rank)
 
 
 def _try_broadcast_to(x, batch_shape, name):
@@ -451,7 +677,12 @@ def _try_broadcast_to(x, batch_shape, name):
   batch_shape_x = x.shape.as_list()[:-1]
   if batch_shape_x != batch_shape:
     try:
-      np.broadcast_to(np.zeros(batch_shape_x), batch_shape)
+      # `np.broadcast_shapes` is pure shape arithmetic and, unlike probing
+      # with `np.broadcast_to`, does not allocate an array of `batch_shape_x`
+      # elements.
+      if list(np.broadcast_shapes(tuple(batch_shape_x),
+                                  tuple(batch_shape))) != batch_shape:
+        raise ValueError()
     except ValueError:
       raise ValueError('Batch shapes of `{2}` should be broadcastable with {0} '
                        'but it is {1} instead'.format(
@@ -85,6 +85,93 @@ class Piecewise(tf.test.TestCase):
       expected_value = np.array([0.41, 1.05, 1.46, 1.66, 1.86, 2.41, 2.46])
       self.assertAllClose(value, expected_value, atol=1e-5, rtol=1e-5)
 
+  def test_piecewise_constant_value_static_float32_jumps(self):
+    """Tests the bucketized path for unbatched static float32 jumps."""
+    dtype = np.float32
+    x = np.array([0., 0.1, 2., 11.], dtype=dtype)
+    jump_locations = np.array([0.1, 10], dtype=dtype)
+    values = tf.constant([3, 4, 5], dtype=dtype)
+    piecewise_func = piecewise.PiecewiseConstantFunc(jump_locations, values,
+                                                     dtype=dtype)
+    # Right-continuous evaluation exercises the `Bucketize` lookup.
+    value = piecewise_func(x, left_continuous=False)
+    self.assertEqual(value.dtype.as_numpy_dtype, dtype)
+    expected_value = np.array([3., 4., 4., 5.])
+    self.assertAllEqual(value, expected_value)
+
+  def test_piecewise_constant_compute_dtype(self):
+    """Tests that compute_dtype casts internally but preserves output dtype."""
+    x = np.array([0., 0.1, 2., 11.])
+    jump_locations = np.array([0.1, 10])
+    values = np.array([3., 4., 5.])
+    piecewise_func = piecewise.PiecewiseConstantFunc(
+        jump_locations, values, dtype=np.float64, compute_dtype=np.float32)
+    # Points supplied both as numpy arrays and as `Tensor`s of the declared
+    # `dtype`; the latter have to be cast down to the compute dtype.
+    for x_arg in (x, tf.constant(x, dtype=tf.float64)):
+      value = piecewise_func(x_arg)
+      integral = piecewise_func.integrate(x_arg, x + 1)
+      self.assertEqual(value.dtype.as_numpy_dtype, np.float64)
+      self.assertEqual(integral.dtype.as_numpy_dtype, np.float64)
+      self.assertAllClose(value, [3., 3., 4., 5.], atol=1e-6, rtol=1e-6)
+      self.assertAllClose(integral, [3.9, 4., 4., 5.], atol=1e-5, rtol=1e-5)
+
+  def test_piecewise_constant_with_variables(self):
+    """Tests that variable-backed data is captured by reference."""
+    dtype = np.float64
+    x = np.array([0., 0.1, 2., 11.])
+    jump_locations = tf.Variable([0.1, 10], dtype=dtype)
+    values = tf.Variable([3., 4., 5.], dtype=dtype)
+    piecewise_func = piecewise.PiecewiseConstantFunc(jump_locations, values)
+    self.evaluate(tf.compat.v1.global_variables_initializer())
+    value = piecewise_func(x)
+    integral = piecewise_func.integrate(x, x + 1)
+    self.assertAllClose(value, [3., 3., 4., 5.], atol=1e-6, rtol=1e-6)
+    self.assertAllClose(integral, [3.9, 4., 4., 5.], atol=1e-5, rtol=1e-5)
+    # Reassigning the variables updates the results of both methods. The
+    # cumulative integrals are rebuilt from the captured variables inside the
+    # integration graph.
+    self.evaluate(values.assign([6., 7., 8.]))
+    value = piecewise_func(x)
+    integral = piecewise_func.integrate(x, x + 1)
+    self.assertAllClose(value, [6., 6., 7., 8.], atol=1e-6, rtol=1e-6)
+    self.assertAllClose(integral, [6.9, 7., 7., 8.], atol=1e-5, rtol=1e-5)
+    # Both evaluations of each method share a single trace. The eager Numba
+    # fast path bypasses the traced graphs, hence the check only covers the
+    # graphs that were built.
+    graphs = list(piecewise_func._call_graphs.values())
+    if piecewise_func._integrate_graph is not None:
+      graphs.append(piecewise_func._integrate_graph)
+    for graph_fn in graphs:
+      self.assertEqual(graph_fn.experimental_get_tracing_count(), 1)
+
+  def test_piecewise_constant_integral_gradient(self):
+    """Tests that integrate is differentiable w.r.t. the function data."""
+    dtype = np.float64
+    jump_locations = tf.constant([1., 2.], dtype=dtype)
+    values = tf.constant([0.1, 0.2, 0.5], dtype=dtype)
+    piecewise_func = piecewise.PiecewiseConstantFunc(jump_locations, values,
+                                                     dtype=dtype)
+    with tf.GradientTape() as tape:
+      tape.watch(values)
+      integral = piecewise_func.integrate([0.], [3.])
+    grad = tape.gradient(integral, values)
+    # Each segment contributes its length to the derivative w.r.t. its value.
+    self.assertAllClose(grad, [1., 1., 1.], atol=1e-6, rtol=1e-6)
+
+  def test_piecewise_constant_value_and_integral_with_xla(self):
+    """Tests PiecewiseConstantFunc with XLA compilation enabled."""
+    dtype = np.float64
+    x = np.array([0., 0.1, 2., 11.])
+    jump_locations = np.array([0.1, 10], dtype=dtype)
+    values = np.array([3., 4., 5.], dtype=dtype)
+    piecewise_func = piecewise.PiecewiseConstantFunc(
+        jump_locations, values, dtype=dtype, use_xla=True)
+    value = piecewise_func(x)
+    integral = piecewise_func.integrate(x, x + 1)
+    self.assertAllEqual(value, [3., 3., 4., 5.])
+    self.assertAllClose(integral, [3.9, 4., 4., 5.], atol=1e-5, rtol=1e-5)
+
   def test_piecewise_constant_value_with_batch(self):
     """Tests PiecewiseConstantFunc with batching."""
     for dtype in [np.float32, np.float64]: